@@ -0,0 +1,183 @@
+"""Agent API wire benchmark
+
+Measure bytes on wire and end-to-end latency of AgentAPI requests against a
+local stand-in agent, comparing a legacy agent (plain JSON only) with an agent
+negotiating compression and msgpack.
+
+usage: python benchmark/agent_wire.py [--requests N] [--items N]
+"""
+import json
+from time import perf_counter
+from asyncio import run, open_connection, start_server, gather
+from argparse import ArgumentParser
+from statistics import mean, quantiles
+from aiohttp import web, ClientSession
+from datashark_cli.agent_api import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    REQUEST_ENCODERS,
+    AgentAPI,
+    msgpack,
+)
+
+
+class Payload:
+    """Stand-in for datashark_core request and response models"""
+
+    def __init__(self, dct):
+        self.dct = dct
+
+    def as_dict(self):
+        """Convert object to dict"""
+        return self.dct
+
+    @classmethod
+    def build(cls, dct):
+        """Build object from dict"""
+        return cls(dct)
+
+
+def make_items(count: int):
+    """Build a payload resembling a processors catalog"""
+    return [
+        {
+            'name': f'processor_{k}',
+            'description': "Process given file and write results to output "
+            "file in the working directory",
+            'arguments': [
+                {
+                    'name': name,
+                    'kind': 'path',
+                    'required': True,
+                    'description': f"Path of {name} relative to workdir",
+                }
+                for name in ('filepath', 'output_file', 'storage_file')
+            ],
+        }
+        for k in range(count)
+    ]
+
+
+def stand_in_agent(modern: bool, items: int) -> web.Application:
+    """Agent answering any POST with a catalog of given size"""
+    result = {'status': True, 'items': make_items(items)}
+
+    async def handler(request):
+        # aiohttp decompresses request body according to Content-Encoding
+        body = await request.read()
+        if request.content_type == JSON_CONTENT_TYPE:
+            json.loads(body)
+        elif (
+            modern and msgpack and request.content_type == MSGPACK_CONTENT_TYPE
+        ):
+            msgpack.unpackb(body)
+        else:
+            raise web.HTTPUnsupportedMediaType()
+        accept = request.headers.get('Accept', '')
+        if modern and msgpack and MSGPACK_CONTENT_TYPE in accept:
+            response = web.Response(
+                body=msgpack.packb(result), content_type=MSGPACK_CONTENT_TYPE
+            )
+        else:
+            response = web.json_response(result)
+        if modern:
+            response.headers['Accept-Encoding'] = ', '.join(REQUEST_ENCODERS)
+            response.enable_compression()
+        return response
+
+    app = web.Application()
+    app.router.add_post('/process', handler)
+    return app
+
+
+class WireCounter:
+    """Count bytes relayed between client and agent"""
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+
+    async def _relay(self, reader, writer, attr):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            setattr(self, attr, getattr(self, attr) + len(data))
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    async def proxy(self, port: int):
+        """Start a TCP proxy to given local port, return proxy server"""
+
+        async def handle(client_reader, client_writer):
+            agent_reader, agent_writer = await open_connection(
+                '127.0.0.1', port
+            )
+            await gather(
+                self._relay(client_reader, agent_writer, 'sent'),
+                self._relay(agent_reader, client_writer, 'received'),
+                return_exceptions=True,
+            )
+
+        return await start_server(handle, '127.0.0.1', 0)
+
+
+async def scenario(name, modern, compression, compact, args):
+    """Run a scenario and print its report line"""
+    runner = web.AppRunner(stand_in_agent(modern, args.items))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    agent_port = runner.addresses[0][1]
+    counter = WireCounter()
+    proxy = await counter.proxy(agent_port)
+    proxy_port = proxy.sockets[0].getsockname()[1]
+    agent = AgentAPI(
+        f'http://127.0.0.1:{proxy_port}/',
+        compression=compression,
+        compact=compact,
+    )
+    url = agent.base_url / 'process'
+    request = Payload({'items': make_items(args.items)})
+    latencies = []
+    async with ClientSession(raise_for_status=True) as session:
+        # first request lets the client learn agent capabilities
+        await agent._post(session, url, request, Payload)
+        counter.sent = counter.received = 0
+        for _ in range(args.requests):
+            start = perf_counter()
+            await agent._post(session, url, request, Payload)
+            latencies.append((perf_counter() - start) * 1000)
+    proxy.close()
+    await proxy.wait_closed()
+    await runner.cleanup()
+    p95 = quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0
+    print(
+        f"{name:<28} {counter.sent // args.requests:>12} "
+        f"{counter.received // args.requests:>12} "
+        f"{mean(latencies):>10.2f} {p95:>10.2f}"
+    )
+
+
+async def main():
+    """Benchmark entry point"""
+    parser = ArgumentParser(description="Agent API wire benchmark")
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--items', type=int, default=500)
+    args = parser.parse_args()
+    print(
+        f"{'scenario':<28} {'req B/call':>12} {'resp B/call':>12} "
+        f"{'mean ms':>10} {'p95 ms':>10}"
+    )
+    await scenario("legacy agent, json", False, True, False, args)
+    await scenario("json, responses compressed", True, False, False, args)
+    await scenario("json, both compressed", True, True, False, args)
+    if msgpack:
+        await scenario("msgpack, both compressed", True, True, True, args)
+    else:
+        print("msgpack is not installed, skipping msgpack scenario")
+
+
+if __name__ == '__main__':
+    run(main())
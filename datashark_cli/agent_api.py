@@ -1,5 +1,9 @@
 """AgentAPI
 """
+import gzip
+import json
+import zlib
+from typing import Set, Dict, Tuple
 from yarl import URL
 from aiohttp import (
     ClientResponseError,
@@ -16,12 +20,73 @@ from datashark_core.model.api import (
 )
 from . import LOGGER
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+MIN_COMPRESS_SIZE = 1024
+# request content codings by order of preference
+REQUEST_ENCODERS = {'gzip': gzip.compress, 'deflate': zlib.compress}
+if zstd:
+    REQUEST_ENCODERS = {'zstd': zstd.compress, **REQUEST_ENCODERS}
+
+
+def _quality(params: str) -> float:
+    """Parse quality value from coding parameters, 1 if missing, 0 if
+    invalid so that a malformed coding is never used
+    """
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() != 'q':
+            continue
+        try:
+            return float(value.strip())
+        except ValueError:
+            return 0.0
+    return 1.0
+
+
+def _accepted_codings(header: str) -> Set[str]:
+    """Parse codings with a non-zero quality from Accept-Encoding header"""
+    codings = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        if _quality(params) <= 0:
+            continue
+        codings.add(coding.strip().lower())
+    return codings
+
 
 class AgentAPI:
-    """Agent API"""
+    """Agent API
+
+    Response compression is negotiated by aiohttp through Accept-Encoding.
+    Request compression is enabled once the agent advertises supported
+    codings using Accept-Encoding response header (RFC 7694). When msgpack is
+    enabled, it is requested through Accept header and used for requests
+    once the agent answered using msgpack. Plain JSON is kept otherwise and
+    used for good if the agent answers 415 Unsupported Media Type.
+    """
 
-    def __init__(self, url: str):
+    def __init__(
+        self, url: str, compression: bool = True, compact: bool = False
+    ):
         self._base_url = URL(url)
+        self._compression = compression
+        self._compact = compact and msgpack is not None
+        self._content_encoding = None
+        self._content_type = JSON_CONTENT_TYPE
+        self._downgraded = False
 
     @property
     def base_url(self):
@@ -34,12 +99,67 @@ class AgentAPI:
         cprint(self._base_url, highlight=True)
         cprint('=' * cwidth())
 
+    def _accept_headers(self) -> Dict[str, str]:
+        """Headers announcing supported response media types"""
+        if not self._compact:
+            return {}
+        return {'Accept': f'{MSGPACK_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.5'}
+
+    def _negotiate(self, headers):
+        """Learn agent capabilities from response headers"""
+        if self._downgraded:
+            return
+        if self._compression and 'Accept-Encoding' in headers:
+            accepted = _accepted_codings(headers['Accept-Encoding'])
+            self._content_encoding = next(
+                (coding for coding in REQUEST_ENCODERS if coding in accepted),
+                None,
+            )
+        if self._compact and headers.get('Content-Type', '').startswith(
+            MSGPACK_CONTENT_TYPE
+        ):
+            self._content_type = MSGPACK_CONTENT_TYPE
+
+    def _downgrade(self) -> bool:
+        """Fall back to plain JSON requests, False if already using it"""
+        if (
+            not self._content_encoding
+            and self._content_type == JSON_CONTENT_TYPE
+        ):
+            return False
+        self._content_encoding = None
+        self._content_type = JSON_CONTENT_TYPE
+        self._downgraded = True
+        return True
+
+    def _encode(self, req_inst) -> Tuple[bytes, Dict[str, str]]:
+        """Encode request body using negotiated media type and coding"""
+        headers = self._accept_headers()
+        headers['Content-Type'] = self._content_type
+        if self._content_type == MSGPACK_CONTENT_TYPE:
+            body = msgpack.packb(req_inst.as_dict())
+        else:
+            body = json.dumps(req_inst.as_dict()).encode()
+        if self._content_encoding and len(body) >= MIN_COMPRESS_SIZE:
+            body = REQUEST_ENCODERS[self._content_encoding](body)
+            headers['Content-Encoding'] = self._content_encoding
+        return body, headers
+
+    async def _decode(self, a_resp, resp_cls):
+        """Decode response body according to its media type"""
+        self._negotiate(a_resp.headers)
+        if a_resp.content_type == MSGPACK_CONTENT_TYPE and msgpack:
+            return resp_cls.build(msgpack.unpackb(await a_resp.read()))
+        return resp_cls.build(await a_resp.json())
+
     async def _get(self, session, url, resp_cls):
         """Sending GET request to the agent listening on the other side"""
         resp_inst = None
         try:
-            async with session.get(url) as a_resp:
-                resp_inst = resp_cls.build(await a_resp.json())
+            async with session.get(
+                url, headers=self._accept_headers()
+            ) as a_resp:
+                resp_inst = await self._decode(a_resp, resp_cls)
         except ClientConnectorError as exc:
             LOGGER.error("failed to connect to agent at %s", self._base_url)
             LOGGER.error(exc)
@@ -53,12 +173,27 @@ class AgentAPI:
             )
         return resp_inst
 
+    async def _send(self, session, url, req_inst, resp_cls):
+        """Send encoded POST request and decode response"""
+        body, headers = self._encode(req_inst)
+        async with session.post(url, data=body, headers=headers) as a_resp:
+            return await self._decode(a_resp, resp_cls)
+
     async def _post(self, session, url, req_inst, resp_cls):
         """Send POST request to the agent listening on the other side"""
         resp_inst = None
         try:
-            async with session.post(url, json=req_inst.as_dict()) as a_resp:
-                resp_inst = resp_cls.build(await a_resp.json())
+            try:
+                resp_inst = await self._send(session, url, req_inst, resp_cls)
+            except ClientResponseError as exc:
+                if exc.status != 415 or not self._downgrade():
+                    raise
+                LOGGER.warning(
+                    "%s does not support compact requests, falling back to "
+                    "plain JSON",
+                    self._base_url,
+                )
+                resp_inst = await self._send(session, url, req_inst, resp_cls)
         except ClientConnectorError as exc:
             LOGGER.error("failed to connect to agent at %s", self._base_url)
             LOGGER.error(exc)
@@ -1,28 +1,98 @@
 """Recipe command
 """
-from typing import Dict, Iterator
+from typing import Dict, List, Tuple, Iterator, Optional
 from pathlib import Path
-from asyncio import create_task, gather
-from argparse import Namespace
+from asyncio import Future, create_task, gather
+from argparse import Namespace, ArgumentTypeError
 from itertools import cycle
 from aiohttp import ClientSession
+from datashark_core.config import override_arg
+from datashark_core.logging import cprint
+from datashark_core.filesystem import get_workdir
 from datashark_core.model.api import Processor
 from .. import LOGGER
 from ..agent_api import AgentAPI
-from ..recipe_api import RecipeAPI
+from ..recipe_api import Task, RecipeAPI
+from ..metrics import CookMetrics, serve_metrics, display_progress
+from ..speculation import DurationHistory, Speculator
+from ..watch import InputWatcher
 from .process import (
     InitiateProcessingError,
-    build_processors_mappings,
-    initiate_processing,
+    build_processors_agents,
+    display_processing,
+    prepare_processor,
 )
 
 
+def _processors_set(val):
+    return set(val.split(','))
+
+
+def _percentile_rank(val):
+    rank = float(val)
+    if not 0 < rank <= 100:
+        raise ArgumentTypeError(f"percentile must be in ]0, 100]: {val}")
+    return rank
+
+
+def _positive_float(val):
+    value = float(val)
+    if value <= 0:
+        raise ArgumentTypeError(f"value must be positive: {val}")
+    return value
+
+
+def _port(val):
+    port = int(val)
+    if not 0 < port < 65536:
+        raise ArgumentTypeError(f"port must be in [1, 65535]: {val}")
+    return port
+
+
+def _non_negative_float(val):
+    value = float(val)
+    if value < 0:
+        raise ArgumentTypeError(f"value must not be negative: {val}")
+    return value
+
+
+async def process_task(
+    session: ClientSession,
+    task: Task,
+    speculator: Speculator,
+    proc_map: Dict[str, Processor],
+    proc_agents_map: Dict[str, List[AgentAPI]],
+    proc_agents_cycle: Dict[str, Iterator[AgentAPI]],
+) -> Tuple[bool, Optional[Future]]:
+    """Perform task processing
+
+    Also return a task completing once losing speculative attempts are over
+    if any.
+    """
+    processor = prepare_processor(
+        task.processor, list(task.arguments.items()), proc_map
+    )
+    agent, processing_resp, settled = await speculator.process(
+        session,
+        processor,
+        proc_agents_map[processor.name],
+        proc_agents_cycle[processor.name],
+    )
+    if not processing_resp:
+        return False, settled
+    display_processing(agent, processing_resp)
+    return processing_resp.result.status, settled
+
+
 async def worker(
     name: str,
     session: ClientSession,
     recipe_api: RecipeAPI,
+    speculator: Speculator,
     proc_map: Dict[str, Processor],
-    proc_agents_map: Dict[str, Iterator[AgentAPI]],
+    proc_agents_map: Dict[str, List[AgentAPI]],
+    proc_agents_cycle: Dict[str, Iterator[AgentAPI]],
+    watcher: Optional[InputWatcher] = None,
 ):
     """Worker initiates processing"""
     while True:
@@ -34,14 +104,17 @@ async def worker(
             # no more task in recipe, terminate worker
             LOGGER.debug("%s stopping.", name)
             return
-        success = False
+        success, settled = False, None
+        if watcher:
+            await watcher.dispatch(task.name)
         try:
-            success = await initiate_processing(
+            success, settled = await process_task(
                 session,
-                task.processor,
-                list(task.arguments.items()),
+                task,
+                speculator,
                 proc_map,
                 proc_agents_map,
+                proc_agents_cycle,
             )
         except InitiateProcessingError as exc:
             LOGGER.error("%s: process_task failed: %s", name, exc)
@@ -52,6 +125,41 @@ async def worker(
         finally:
             # notify recipe api that retrieved task is done
             recipe_api.task_done(task, success)
+            if watcher:
+                # outputs are settled once losing attempts are over
+                await watcher.refresh(task.name, settled)
+
+
+async def run_workers(
+    worker_count: int,
+    session: ClientSession,
+    recipe_api: RecipeAPI,
+    speculator: Speculator,
+    proc_map: Dict[str, Processor],
+    proc_agents_map: Dict[str, List[AgentAPI]],
+    proc_agents_cycle: Dict[str, Iterator[AgentAPI]],
+    watcher: Optional[InputWatcher] = None,
+):
+    """Create workers and wait until they processed all recipe tasks"""
+    tasks = []
+    for k in range(worker_count):
+        task = create_task(
+            worker(
+                f'worker-{k}',
+                session,
+                recipe_api,
+                speculator,
+                proc_map,
+                proc_agents_map,
+                proc_agents_cycle,
+                watcher,
+            )
+        )
+        tasks.append(task)
+    # no need to join queue, gathering workers should be enough according to
+    # RecipeAPI internal processing which ensures that workers are terminated
+    # when queue is empty by sending them None instead of a Task instance
+    await gather(*tasks, return_exceptions=True)
 
 
 async def cook_cmd(session: ClientSession, args: Namespace):
@@ -64,7 +172,7 @@ async def cook_cmd(session: ClientSession, args: Namespace):
         LOGGER.error("cannot cook recipe: %s", exc)
         return
     # retrieve processors and agents supporting these processors
-    processor_map, processor_agents_map = await build_processors_mappings(
+    processor_map, processor_agents_map = await build_processors_agents(
         session, args.agents
     )
     # check if all required processors are available
@@ -77,26 +185,119 @@ async def cook_cmd(session: ClientSession, args: Namespace):
         )
         return
     # turn agents lists into cycles for load balancing
-    processor_agents_map = {
+    processor_agents_cycle = {
         name: cycle(agents) for name, agents in processor_agents_map.items()
     }
-    # create workers to process recipe instructions
-    tasks = []
-    for k in range(args.worker_count):
-        task = create_task(
-            worker(
-                f'worker-{k}',
+    # prepare speculative execution of straggling idempotent tasks
+    idempotent = set()
+    if args.speculate:
+        idempotent = override_arg(
+            args.idempotent,
+            args.config,
+            'datashark.cli.idempotent',
+            default=[],
+        )
+        idempotent = set(idempotent)
+    history = DurationHistory(args.history_file)
+    history.load()
+    if args.speculate:
+        if not idempotent:
+            LOGGER.warning(
+                "speculation requested but no idempotent processor given, "
+                "use --idempotent or datashark.cli.idempotent"
+            )
+        elif args.speculate_after is None:
+            never = {
+                name
+                for name in idempotent
+                if history.expected(name, args.speculate_percentile) is None
+            }
+            if never:
+                LOGGER.warning(
+                    "speculation cannot trigger for %s until a first "
+                    "successful run is recorded, use --speculate-after",
+                    never,
+                )
+    speculator = Speculator(
+        idempotent,
+        history,
+        rank=args.speculate_percentile,
+        factor=args.speculate_factor,
+        fallback=args.speculate_after,
+    )
+    # expose metrics and progress if requested
+    metrics = CookMetrics(
+        recipe_api, args.agents, speculator.load, session.connector
+    )
+    metrics_runner = None
+    if args.metrics_port:
+        try:
+            metrics_runner = await serve_metrics(
+                metrics, args.metrics_host, args.metrics_port
+            )
+        except OSError as exc:
+            LOGGER.error("cannot serve metrics: %s", exc)
+    progress_task = None
+    if args.progress:
+        progress_task = create_task(display_progress(metrics, args.progress))
+    watcher = None
+    if args.watch:
+        watcher = InputWatcher(get_workdir(args.config), recipe_api.tasks)
+        await watcher.snapshot()
+        undeclared = {
+            task.name for task in recipe_api.tasks if not task.outputs
+        }
+        if undeclared:
+            LOGGER.warning(
+                "tasks without 'outputs' key, changes made to their inputs "
+                "while they are running will be missed: %s",
+                undeclared,
+            )
+    try:
+        await run_workers(
+            args.worker_count,
+            session,
+            recipe_api,
+            speculator,
+            processor_map,
+            processor_agents_map,
+            processor_agents_cycle,
+            watcher,
+        )
+        if not watcher:
+            return
+        # re-cook tasks whose inputs changed and their dependents, changes
+        # which occurred while cooking are taken into account
+        while True:
+            metrics.pause()
+            LOGGER.info("watching recipe inputs for changes...")
+            changed = await watcher.wait_for_changes(
+                args.watch_interval, args.debounce, await watcher.poll()
+            )
+            names = recipe_api.affected(watcher.affected(changed))
+            LOGGER.info("inputs changed, re-cooking tasks: %s", names)
+            round_api = recipe_api.subset(names)
+            metrics.reset(round_api)
+            await run_workers(
+                args.worker_count,
                 session,
-                recipe_api,
+                round_api,
+                speculator,
                 processor_map,
                 processor_agents_map,
+                processor_agents_cycle,
+                watcher,
             )
-        )
-        tasks.append(task)
-    # no need to join queue, gathering workers should be enough according to
-    # RecipeAPI internal processing which ensures that workers are terminated
-    # when queue is empty by sending them None instead of a Task instance
-    await gather(*tasks, return_exceptions=True)
+            history.save()
+    finally:
+        await speculator.abandon()
+        history.save()
+        if progress_task:
+            progress_task.cancel()
+            await gather(progress_task, return_exceptions=True)
+            cprint(metrics.summary(), highlight=True)
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 
 def setup(subparsers):
@@ -120,5 +321,82 @@ def setup(subparsers):
         type=Path,
         help="Variables file to apply for recipe",
     )
+    parser.add_argument(
+        '--speculate',
+        action='store_true',
+        help="Launch a duplicate of straggling idempotent tasks on an idle "
+        "agent offering the same processor and keep the first success. "
+        "Agents cannot cancel processing, the losing agent keeps running "
+        "and writing the same outputs after dependent tasks started.",
+    )
+    parser.add_argument(
+        '--idempotent',
+        type=_processors_set,
+        help="Comma separated list of idempotent processors which can be "
+        "speculatively re-executed",
+    )
+    parser.add_argument(
+        '--speculate-percentile',
+        type=_percentile_rank,
+        default=90,
+        help="Percentile of processor duration history used as expected "
+        "duration",
+    )
+    parser.add_argument(
+        '--speculate-factor',
+        type=_positive_float,
+        default=2.0,
+        help="Task is considered straggling when running longer than "
+        "expected duration times this factor",
+    )
+    parser.add_argument(
+        '--speculate-after',
+        type=_non_negative_float,
+        help="Seconds after which a task is considered straggling when "
+        "processor has no duration history",
+    )
+    parser.add_argument(
+        '--history-file',
+        type=Path,
+        help="File where processor duration history is loaded from and "
+        "saved to across runs",
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=_port,
+        help="Serve OpenMetrics at http://<metrics-host>:<metrics-port>/metrics "
+        "while cooking",
+    )
+    parser.add_argument(
+        '--metrics-host',
+        default='127.0.0.1',
+        help="Address metrics endpoint listens on",
+    )
+    parser.add_argument(
+        '--progress',
+        type=_positive_float,
+        metavar='SECONDS',
+        help="Display a progress summary every SECONDS while cooking",
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help="Keep watching paths referenced in task arguments once recipe "
+        "is cooked and re-cook tasks whose inputs changed along with tasks "
+        "depending on them. Tasks should list the arguments they write in "
+        "their 'outputs' key.",
+    )
+    parser.add_argument(
+        '--watch-interval',
+        type=_positive_float,
+        default=2.0,
+        help="Seconds between two polls of watched paths",
+    )
+    parser.add_argument(
+        '--debounce',
+        type=_positive_float,
+        default=2.0,
+        help="Seconds watched paths must remain unchanged before re-cooking",
+    )
     parser.add_argument('recipe', type=Path, help="Path to recipe to cook")
     parser.set_defaults(async_func=cook_cmd)
@@ -7,7 +7,7 @@ from itertools import cycle
 from collections import defaultdict
 from aiohttp import ClientSession
 from datashark_core.logging import cprint
-from datashark_core.model.api import Processor
+from datashark_core.model.api import Processor, ProcessingResponse
 from .. import LOGGER
 from ..agent_api import AgentAPI
 
@@ -16,9 +16,9 @@ class InitiateProcessingError(Exception):
     """Initiate processing error"""
 
 
-async def build_processors_mappings(
+async def build_processors_agents(
     session: ClientSession, agents: List[AgentAPI]
-) -> Tuple[Dict[str, Processor], Dict[str, Iterator[AgentAPI]]]:
+) -> Tuple[Dict[str, Processor], Dict[str, List[AgentAPI]]]:
     """For each processor, create a list of agents providing this processor"""
     proc_map = {}
     proc_agents_map = defaultdict(list)
@@ -29,6 +29,14 @@ async def build_processors_mappings(
         for processor in proc_resp.processors:
             proc_map[processor.name] = processor
             proc_agents_map[processor.name].append(agent)
+    return proc_map, dict(proc_agents_map)
+
+
+async def build_processors_mappings(
+    session: ClientSession, agents: List[AgentAPI]
+) -> Tuple[Dict[str, Processor], Dict[str, Iterator[AgentAPI]]]:
+    """For each processor, create a cycle of agents providing this processor"""
+    proc_map, proc_agents_map = await build_processors_agents(session, agents)
     # turn agents lists into cycles
     proc_agents_map = {
         name: cycle(agents) for name, agents in proc_agents_map.items()
@@ -37,14 +45,12 @@ async def build_processors_mappings(
     return proc_map, proc_agents_map
 
 
-async def initiate_processing(
-    session: ClientSession,
+def prepare_processor(
     proc_name: str,
     proc_arguments: List[Tuple[str, str]],
     proc_map: Dict[str, Processor],
-    proc_agents_map: Dict[str, Iterator[AgentAPI]],
-) -> bool:
-    """Perform processing"""
+) -> Processor:
+    """Build a processor instance with validated arguments"""
     # attempt to retrieve processor
     processor = proc_map.get(proc_name)
     if not processor:
@@ -65,14 +71,31 @@ async def initiate_processing(
     # validate processor arguments
     if not processor.validate_arguments():
         raise InitiateProcessingError("arguments validation failed!")
+    return processor
+
+
+def display_processing(agent: AgentAPI, processing_resp: ProcessingResponse):
+    """Display processing response sent back by agent"""
+    agent.display_banner()
+    processing_resp.result.display()
+
+
+async def initiate_processing(
+    session: ClientSession,
+    proc_name: str,
+    proc_arguments: List[Tuple[str, str]],
+    proc_map: Dict[str, Processor],
+    proc_agents_map: Dict[str, Iterator[AgentAPI]],
+) -> bool:
+    """Perform processing"""
+    processor = prepare_processor(proc_name, proc_arguments, proc_map)
     # arguments are valid, now we need to find an agent supporting this
     # processor and send a processing request to it
     agent = next(proc_agents_map[processor.name])
     processing_resp = await agent.process(session, processor)
     if not processing_resp:
         return False
-    agent.display_banner()
-    processing_resp.result.display()
+    display_processing(agent, processing_resp)
     return processing_resp.result.status
 
 
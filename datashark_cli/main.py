@@ -13,7 +13,7 @@ from datashark_core.logging import LOGGING_MANAGER, setup_logging
 from datashark_core.filesystem import get_workdir
 from . import LOGGER
 from .command import setup as setup_commands
-from .agent_api import AgentAPI
+from .agent_api import AgentAPI, msgpack
 
 
 def _agents_list(val):
@@ -56,6 +56,16 @@ def parse_args():
         default=10,
         help="Limit of simultaneous connections to the same endpoint, 0 means unlimited",
     )
+    parser.add_argument(
+        '--no-compression',
+        action='store_true',
+        help="Never compress requests sent to agents",
+    )
+    parser.add_argument(
+        '--msgpack',
+        action='store_true',
+        help="Use msgpack encoding with agents supporting it instead of JSON",
+    )
     cmd = parser.add_subparsers(dest='cmd', help="Command to invoke")
     cmd.required = True
     setup_commands(cmd)
@@ -106,7 +116,16 @@ async def start_session(args):
     ssl_context = prepare_ssl_context(args)
     # build agent URL list depending on ssl_context
     scheme = 'https' if ssl_context else 'http'
-    args.agents = [AgentAPI(f'{scheme}://{agent}/') for agent in args.agents]
+    if args.msgpack and not msgpack:
+        LOGGER.warning("msgpack is not installed, falling back to JSON")
+    args.agents = [
+        AgentAPI(
+            f'{scheme}://{agent}/',
+            compression=not args.no_compression,
+            compact=args.msgpack,
+        )
+        for agent in args.agents
+    ]
     # create TCP connector using custom ssl context
     connector = TCPConnector(
         limit=args.limit,
@@ -0,0 +1,288 @@
+"""Cook metrics endpoint and progress view
+"""
+from math import inf
+from time import monotonic
+from typing import Dict, List, Tuple, Optional
+from asyncio import sleep
+from datetime import timedelta
+from aiohttp import web
+from datashark_core.logging import cprint
+from . import LOGGER
+from .agent_api import AgentAPI
+from .recipe_api import RecipeAPI
+
+FINAL_STATES = ('done', 'failed', 'cancelled')
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 1800, 3600, 4 * 3600, inf)
+OPENMETRICS_CONTENT_TYPE = (
+    'application/openmetrics-text; version=1.0.0; charset=utf-8'
+)
+
+
+def _format_value(value: float) -> str:
+    if value == inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    text = ','.join(f'{name}="{value}"' for name, value in labels.items())
+    return f'{{{text}}}'
+
+
+class Histogram:
+    """Cumulative histogram of observed values"""
+
+    def __init__(self, buckets: Tuple[float] = LATENCY_BUCKETS):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def count(self) -> int:
+        """Number of observed values"""
+        return self._count
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Mean of observed values or None if nothing observed"""
+        if not self._count:
+            return None
+        return self._sum / self._count
+
+    def observe(self, value: float):
+        """Observe a value"""
+        for index, bound in enumerate(self._buckets):
+            if value <= bound:
+                self._counts[index] += 1
+        self._sum += value
+        self._count += 1
+
+    def samples(self, name: str, labels: Dict[str, str]) -> List[str]:
+        """OpenMetrics samples for this histogram"""
+        lines = []
+        for bound, count in zip(self._buckets, self._counts):
+            bucket_labels = dict(labels, le=_format_value(bound))
+            lines.append(
+                f'{name}_bucket{_format_labels(bucket_labels)} {count}'
+            )
+        lines.append(f'{name}_sum{_format_labels(labels)} {self._sum}')
+        lines.append(f'{name}_count{_format_labels(labels)} {self._count}')
+        return lines
+
+
+class CookMetrics:
+    """Gather metrics of a running cook command"""
+
+    def __init__(
+        self, recipe_api: RecipeAPI, agents: List[AgentAPI], load, connector
+    ):
+        """load is the AgentLoad instance tracking processing requests"""
+        self._recipe_api = recipe_api
+        self._agents = agents
+        self._load = load
+        self._connector = connector
+        self._start = monotonic()
+        self._rounds = 1
+        self._previous = dict.fromkeys(FINAL_STATES, 0)
+        self._paused = False
+
+    @property
+    def paused(self) -> bool:
+        """True while waiting for the next round"""
+        return self._paused
+
+    def pause(self):
+        """Current round is over, wait for the next one"""
+        self._paused = True
+
+    def reset(self, recipe_api: RecipeAPI):
+        """Follow another recipe API for a new round, restarting ETA
+        estimation and keeping cumulative task counts
+        """
+        stats = self._recipe_api.stats
+        for state in FINAL_STATES:
+            self._previous[state] += stats[state]
+        self._recipe_api = recipe_api
+        self._start = monotonic()
+        self._rounds += 1
+        self._paused = False
+
+    def totals(self) -> Dict[str, int]:
+        """Number of processed tasks per final state across all rounds"""
+        stats = self._recipe_api.stats
+        return {
+            state: self._previous[state] + stats[state]
+            for state in FINAL_STATES
+        }
+
+    def connector_stats(self) -> Tuple[int, Dict[str, int]]:
+        """Number of acquired connections overall and per host
+
+        aiohttp does not expose these counters publicly, fall back to zero
+        if connector internals change.
+        """
+        acquired = len(getattr(self._connector, '_acquired', ()))
+        per_host = {
+            f'{key.host}:{key.port}': len(protos)
+            for key, protos in getattr(
+                self._connector, '_acquired_per_host', {}
+            ).items()
+        }
+        return acquired, per_host
+
+    def eta(self) -> Optional[float]:
+        """Estimated remaining seconds based on current throughput"""
+        stats = self._recipe_api.stats
+        finished = stats['done'] + stats['failed'] + stats['cancelled']
+        remaining = stats['waiting'] + stats['ready'] + stats['running']
+        if not finished:
+            return None
+        return (monotonic() - self._start) / finished * remaining
+
+    def render(self) -> str:
+        """Render metrics using OpenMetrics text format"""
+        lines = [
+            '# TYPE datashark_cook_tasks gauge',
+            '# HELP datashark_cook_tasks Number of recipe tasks per state',
+        ]
+        for state, count in self._recipe_api.stats.items():
+            lines.append(f'datashark_cook_tasks{{state="{state}"}} {count}')
+        lines.extend(
+            [
+                '# TYPE datashark_cook_tasks_processed counter',
+                '# HELP datashark_cook_tasks_processed Number of processed '
+                'tasks per final state across all rounds',
+            ]
+        )
+        for state, count in self.totals().items():
+            lines.append(
+                f'datashark_cook_tasks_processed_total{{state="{state}"}} '
+                f'{count}'
+            )
+        lines.extend(
+            [
+                '# TYPE datashark_cook_rounds counter',
+                '# HELP datashark_cook_rounds Number of cooking rounds',
+                f'datashark_cook_rounds_total {self._rounds}',
+            ]
+        )
+        lines.extend(
+            [
+                '# TYPE datashark_cook_agent_inflight gauge',
+                '# HELP datashark_cook_agent_inflight In-flight processing '
+                'requests per agent',
+            ]
+        )
+        for agent in self._agents:
+            labels = _format_labels({'agent': str(agent.base_url)})
+            lines.append(
+                f'datashark_cook_agent_inflight{labels} {self._load.inflight(agent)}'
+            )
+        lines.extend(
+            [
+                '# TYPE datashark_cook_agent_latency_seconds histogram',
+                '# HELP datashark_cook_agent_latency_seconds Processing '
+                'request latency per agent',
+            ]
+        )
+        for agent in self._agents:
+            lines.extend(
+                self._load.latency(agent).samples(
+                    'datashark_cook_agent_latency_seconds',
+                    {'agent': str(agent.base_url)},
+                )
+            )
+        acquired, per_host = self.connector_stats()
+        lines.extend(
+            [
+                '# TYPE datashark_cook_connections gauge',
+                '# HELP datashark_cook_connections Acquired connections',
+                f'datashark_cook_connections {acquired}',
+                '# TYPE datashark_cook_connections_limit gauge',
+                '# HELP datashark_cook_connections_limit Connection limit, '
+                '0 means unlimited',
+                f'datashark_cook_connections_limit {self._connector.limit}',
+                '# TYPE datashark_cook_host_connections gauge',
+                '# HELP datashark_cook_host_connections Acquired connections '
+                'per host',
+            ]
+        )
+        for host, count in per_host.items():
+            labels = _format_labels({'host': host})
+            lines.append(f'datashark_cook_host_connections{labels} {count}')
+        lines.extend(
+            [
+                '# TYPE datashark_cook_host_connections_limit gauge',
+                '# HELP datashark_cook_host_connections_limit Connection '
+                'limit per host, 0 means unlimited',
+                'datashark_cook_host_connections_limit '
+                f'{self._connector.limit_per_host}',
+            ]
+        )
+        eta = self.eta()
+        if eta is not None:
+            lines.extend(
+                [
+                    '# TYPE datashark_cook_eta_seconds gauge',
+                    '# HELP datashark_cook_eta_seconds Estimated remaining '
+                    'time',
+                    f'datashark_cook_eta_seconds {eta}',
+                ]
+            )
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Compact progress summary"""
+        stats = self._recipe_api.stats
+        tasks = ' '.join(f'{state}={count}' for state, count in stats.items())
+        totals = ' '.join(
+            f'{state}={count}' for state, count in self.totals().items()
+        )
+        agents = ' '.join(
+            f'{agent.base_url.host}:{agent.base_url.port}='
+            f'{self._load.inflight(agent)}'
+            for agent in self._agents
+        )
+        acquired, _ = self.connector_stats()
+        limit = self._connector.limit or '-'
+        eta = self.eta()
+        eta = str(timedelta(seconds=int(eta))) if eta is not None else '?'
+        return (
+            f"round[{self._rounds}] tasks[{tasks}] total[{totals}] "
+            f"inflight[{agents}] pool[{acquired}/{limit}] eta[{eta}]"
+        )
+
+
+async def serve_metrics(
+    metrics: CookMetrics, host: str, port: int
+) -> web.AppRunner:
+    """Start serving metrics over HTTP, caller must cleanup returned runner"""
+
+    async def metrics_handler(_request):
+        return web.Response(
+            body=metrics.render().encode(),
+            headers={'Content-Type': OPENMETRICS_CONTENT_TYPE},
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    LOGGER.info("serving metrics at http://%s:%d/metrics", host, port)
+    return runner
+
+
+async def display_progress(metrics: CookMetrics, interval: float):
+    """Periodically display progress summary until cancelled, nothing is
+    displayed while metrics are paused
+    """
+    while True:
+        await sleep(interval)
+        if not metrics.paused:
+            cprint(metrics.summary(), highlight=True)
@@ -1,9 +1,9 @@
 """Recipe API
 """
-from typing import Set, Dict, Optional
+from typing import Set, Dict, List, Optional
 from pathlib import Path
 from asyncio import sleep
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from ruamel.yaml import safe_load
 from . import LOGGER
 
@@ -14,16 +14,24 @@ class Task:
     requires: Set[str]
     processor: str
     arguments: Dict[str, str]
+    outputs: Set[str] = field(default_factory=set)
 
     @classmethod
     def build(cls, dct):
         """Build object from dict"""
-        return cls(
+        task = cls(
             name=dct['name'],
             requires=set(dct.get('requires', [])),
             processor=dct['processor'],
             arguments=dct['arguments'],
+            outputs=set(dct.get('outputs', [])),
         )
+        unknown = task.outputs.difference(task.arguments)
+        if unknown:
+            raise ValueError(
+                f"task {task.name} outputs are not arguments: {unknown}"
+            )
+        return task
 
     def set_variables(self, variables: Dict[str, str]):
         """Format arguments using variables"""
@@ -42,12 +50,36 @@ class RecipeAPI:
     def __init__(self, filepath: Path):
         self._filepath = filepath
         self._task_map = {}
+        self._recipe = {}
+        self._outcomes = {}
+        self._running = 0
+        self._done = 0
+        self._failed = 0
+        self._cancelled = 0
 
     @property
     def required_processors(self) -> Set[str]:
         """Name of all processors required to process recipe"""
         return {task.processor for task in self._task_map.values()}
 
+    @property
+    def tasks(self) -> List[Task]:
+        """All tasks of prepared recipe"""
+        return list(self._recipe.values())
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Number of tasks in each state"""
+        ready = sum(1 for task in self._task_map.values() if not task.requires)
+        return {
+            'waiting': len(self._task_map) - ready,
+            'ready': ready,
+            'running': self._running,
+            'done': self._done,
+            'failed': self._failed,
+            'cancelled': self._cancelled,
+        }
+
     def _check_inexistant_requires(self):
         """Determine if references to inexistant tasks"""
         all_task_requires = set()
@@ -99,6 +131,62 @@ class RecipeAPI:
         # perform checks
         self._check_inexistant_requires()
         self._check_acyclic_requires_graph()
+        # keep a pristine copy of tasks because processing alters requires
+        self._recipe = {
+            name: replace(task, requires=set(task.requires))
+            for name, task in self._task_map.items()
+        }
+
+    def dependents(self, names: Set[str]) -> Set[str]:
+        """Names of given tasks and of all tasks depending on them"""
+        selected = set(names)
+        while True:
+            depending = {
+                name
+                for name, task in self._recipe.items()
+                if name not in selected and task.requires & selected
+            }
+            if not depending:
+                return selected
+            selected.update(depending)
+
+    def affected(self, names: Set[str]) -> Set[str]:
+        """Names of tasks to process again when given tasks inputs changed
+
+        Tasks depending on given tasks are included, so are required tasks
+        which did not succeed during last processing, recursively.
+        """
+        selected = set(names)
+        while True:
+            grown = self.dependents(selected)
+            grown.update(
+                {
+                    required
+                    for name in grown
+                    for required in self._recipe[name].requires
+                    if not self._outcomes.get(required)
+                }
+            )
+            if grown == selected:
+                return selected
+            selected = grown
+
+    def subset(self, names: Set[str]) -> 'RecipeAPI':
+        """Build a recipe API processing only given tasks of this recipe
+
+        Requirements on tasks outside of the subset are considered satisfied,
+        use affected to select names. Task outcomes are shared with this
+        recipe API.
+        """
+        recipe_api = RecipeAPI(self._filepath)
+        for name in names:
+            task = self._recipe[name]
+            recipe_api._task_map[name] = replace(
+                task, requires=task.requires & names
+            )
+        recipe_api._recipe = self._recipe
+        recipe_api._outcomes = self._outcomes
+        return recipe_api
 
     async def get_task(self) -> Optional[Task]:
         """Get next task or None if no task remaining"""
@@ -110,6 +198,7 @@ class RecipeAPI:
             # remove from task map
             for ready_task in ready_tasks:
                 del self._task_map[ready_task.name]
+                self._running += 1
                 return ready_task
             # async sleep
             await sleep(0)
@@ -117,12 +206,16 @@ class RecipeAPI:
 
     def task_done(self, task: Task, success: bool):
         """Mark a task as done"""
+        self._running -= 1
+        self._outcomes[task.name] = success
         # remove task from waiting tasks requires list
         if success:
+            self._done += 1
             for waiting_task in self._task_map.values():
                 waiting_task.requires.discard(task.name)
             return
         # remove failed tasks recursively
+        self._failed += 1
         failed_tasks = [task]
         while failed_tasks:
             new_failed_tasks = []
@@ -135,5 +228,7 @@ class RecipeAPI:
             # removed cancel tasks if any
             for new_failed_task in new_failed_tasks:
                 del self._task_map[new_failed_task.name]
+                self._outcomes[new_failed_task.name] = False
+                self._cancelled += 1
             # remove tasks depending on new failed tasks
             failed_tasks = new_failed_tasks
@@ -0,0 +1,260 @@
+"""Speculative re-execution of straggler tasks
+"""
+import json
+from math import ceil
+from time import monotonic
+from typing import Set, List, Tuple, Iterator, Optional
+from asyncio import Task, create_task, wait, FIRST_COMPLETED
+from pathlib import Path
+from contextlib import contextmanager
+from collections import defaultdict, deque
+from aiohttp import ClientSession
+from datashark_core.model.api import Processor, ProcessingResponse
+from . import LOGGER
+from .agent_api import AgentAPI
+from .metrics import Histogram
+
+HISTORY_SIZE = 100
+POLL_INTERVAL = 1.0
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """Nearest-rank percentile of given values"""
+    values = sorted(values)
+    index = max(ceil(rank / 100 * len(values)), 1) - 1
+    return values[index]
+
+
+class DurationHistory:
+    """Per-processor history of successful processing durations"""
+
+    def __init__(self, filepath: Optional[Path] = None):
+        self._filepath = filepath
+        self._durations = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+
+    def load(self):
+        """Load history from file if any"""
+        if not self._filepath or not self._filepath.is_file():
+            return
+        try:
+            data = json.loads(self._filepath.read_text())
+        except (OSError, ValueError) as exc:
+            LOGGER.warning("cannot load duration history: %s", exc)
+            return
+        for name, durations in data.items():
+            self._durations[name].extend(durations)
+
+    def save(self):
+        """Save history to file if any"""
+        if not self._filepath:
+            return
+        data = {
+            name: list(durations)
+            for name, durations in self._durations.items()
+        }
+        try:
+            self._filepath.write_text(json.dumps(data))
+        except OSError as exc:
+            LOGGER.warning("cannot save duration history: %s", exc)
+
+    def record(self, name: str, duration: float):
+        """Record a successful processing duration"""
+        self._durations[name].append(duration)
+
+    def expected(self, name: str, rank: float) -> Optional[float]:
+        """Expected duration for processor or None if no history"""
+        durations = self._durations.get(name)
+        if not durations:
+            return None
+        return percentile(list(durations), rank)
+
+
+class AgentLoad:
+    """Track in-flight processing requests and their latency per agent"""
+
+    def __init__(self):
+        self._inflight = defaultdict(int)
+        self._latency = defaultdict(Histogram)
+
+    def inflight(self, agent: AgentAPI) -> int:
+        """Number of in-flight processing requests for agent"""
+        return self._inflight[agent]
+
+    def latency(self, agent: AgentAPI) -> Histogram:
+        """Latency histogram of completed processing requests for agent"""
+        return self._latency[agent]
+
+    def idle(self, agents: List[AgentAPI]) -> List[AgentAPI]:
+        """Filter idle agents from given list"""
+        return [agent for agent in agents if not self._inflight[agent]]
+
+    @contextmanager
+    def track(self, agent: AgentAPI):
+        """Count a processing request as in-flight while in context"""
+        self._inflight[agent] += 1
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self._inflight[agent] -= 1
+        # cancelled requests are not accounted in latency
+        self._latency[agent].observe(monotonic() - start)
+
+
+class Speculator:
+    """Launch a duplicate of straggling idempotent processing on an idle
+    agent and keep the first success
+
+    Agents cannot be asked to cancel processing, the losing agent keeps
+    running and writing the same outputs. The losing request is therefore
+    kept until it completes so that callers can wait for the losing agent
+    to be done, see settled task returned by process.
+    """
+
+    def __init__(
+        self,
+        idempotent: Set[str],
+        history: DurationHistory,
+        rank: float = 90,
+        factor: float = 2.0,
+        fallback: Optional[float] = None,
+    ):
+        self._idempotent = idempotent
+        self._history = history
+        self._rank = rank
+        self._factor = factor
+        self._fallback = fallback
+        self._load = AgentLoad()
+        self._lingering = set()
+
+    @property
+    def load(self) -> AgentLoad:
+        """Agent load tracker"""
+        return self._load
+
+    def threshold(self, name: str) -> Optional[float]:
+        """Duration after which processing is considered straggling"""
+        if name not in self._idempotent:
+            return None
+        expected = self._history.expected(name, self._rank)
+        if expected is None:
+            return self._fallback
+        return expected * self._factor
+
+    async def _process(
+        self, session: ClientSession, agent: AgentAPI, processor: Processor
+    ):
+        """Send processing request to agent and time it
+
+        An attempt raising an exception is reported as failed so that other
+        attempts keep running.
+        """
+        start = monotonic()
+        try:
+            with self._load.track(agent):
+                processing_resp = await agent.process(session, processor)
+        except Exception as exc:
+            LOGGER.error(
+                "%s: processing %s failed: %r",
+                agent.base_url,
+                processor.name,
+                exc,
+            )
+            processing_resp = None
+        return agent, processing_resp, monotonic() - start
+
+    async def _backup(
+        self, primary: AgentAPI, agents: List[AgentAPI], pending
+    ) -> Optional[AgentAPI]:
+        """Wait for an idle agent until pending processing completes"""
+        while True:
+            candidates = [
+                agent for agent in self._load.idle(agents) if agent != primary
+            ]
+            if candidates:
+                return candidates[0]
+            done, _ = await wait(pending, timeout=POLL_INTERVAL)
+            if done:
+                return None
+
+    async def process(
+        self,
+        session: ClientSession,
+        processor: Processor,
+        agents: List[AgentAPI],
+        agent_cycle: Iterator[AgentAPI],
+    ) -> Tuple[AgentAPI, Optional[ProcessingResponse], Optional[Task]]:
+        """Perform processing, speculatively re-executing stragglers
+
+        Return agent and processing response of the first successful attempt or
+        of the last attempt if all of them failed, along with a task
+        completing once losing attempts are over if any.
+        """
+        primary = next(agent_cycle)
+        pending = {create_task(self._process(session, primary, processor))}
+        agent, processing_resp = primary, None
+        try:
+            threshold = self.threshold(processor.name)
+            if threshold is not None:
+                done, _ = await wait(pending, timeout=threshold)
+                if not done:
+                    backup = await self._backup(primary, agents, pending)
+                    if backup:
+                        LOGGER.info(
+                            "%s on %s exceeded %.1fs, speculating on %s",
+                            processor.name,
+                            primary.base_url,
+                            threshold,
+                            backup.base_url,
+                        )
+                        pending.add(
+                            create_task(
+                                self._process(session, backup, processor)
+                            )
+                        )
+            while pending:
+                done, pending = await wait(
+                    pending, return_when=FIRST_COMPLETED
+                )
+                for completed in done:
+                    agent, processing_resp, duration = completed.result()
+                    if processing_resp and processing_resp.result.status:
+                        settled = self._settle(
+                            processor.name, duration, pending
+                        )
+                        pending = set()
+                        return agent, processing_resp, settled
+        finally:
+            # only reached with pending attempts when cancelled
+            for attempt in pending:
+                attempt.cancel()
+        return agent, processing_resp, None
+
+    def _settle(self, name: str, duration: float, losers) -> Optional[Task]:
+        """Record duration once losing attempts are over
+
+        Return None if there is no losing attempt, a task completing once
+        all losing attempts are over otherwise.
+        """
+        if not losers:
+            self._history.record(name, duration)
+            return None
+
+        async def linger():
+            await wait(losers)
+            self._history.record(name, duration)
+
+        self._lingering.update(losers)
+        settled = create_task(linger())
+        settled.add_done_callback(
+            lambda _: self._lingering.difference_update(losers)
+        )
+        return settled
+
+    async def abandon(self):
+        """Stop waiting for losing attempts still running"""
+        lingering = set(self._lingering)
+        for attempt in lingering:
+            attempt.cancel()
+        if lingering:
+            await wait(lingering)
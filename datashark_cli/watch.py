@@ -0,0 +1,161 @@
+"""Watch recipe inputs for changes
+"""
+from typing import Set, Dict, List, Tuple, Optional
+from asyncio import Future, create_task, sleep, wait, get_running_loop
+from pathlib import Path
+from collections import defaultdict
+from . import LOGGER
+from .recipe_api import Task
+
+Signature = Optional[Tuple[int, int, int]]
+
+
+def path_signature(path: Path) -> Signature:
+    """Compute a cheap signature of a file or of a directory content
+
+    Signature is None if path does not exist, (mtime, size, count) otherwise
+    where directory mtime and size are the latest mtime and the total size of
+    files it contains recursively.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    if not path.is_dir():
+        return (stat.st_mtime_ns, stat.st_size, 1)
+    mtime, size, count = stat.st_mtime_ns, 0, 0
+    for filepath in path.rglob('*'):
+        try:
+            stat = filepath.stat()
+        except OSError:
+            continue
+        mtime = max(mtime, stat.st_mtime_ns)
+        size += stat.st_size
+        count += 1
+    return (mtime, size, count)
+
+
+class InputWatcher:
+    """Poll paths referenced in task arguments and map changes to tasks"""
+
+    def __init__(self, workdir: Path, tasks: List[Task]):
+        self._workdir = workdir.resolve()
+        self._path_tasks = defaultdict(set)
+        self._task_paths = defaultdict(set)
+        self._task_outputs = {}
+        for task in tasks:
+            for value in task.arguments.values():
+                path = self._workdir_path(value)
+                if path:
+                    self._path_tasks[path].add(task.name)
+                    self._task_paths[task.name].add(path)
+            if task.outputs:
+                self._task_outputs[task.name] = {
+                    self._workdir_path(task.arguments[name])
+                    for name in task.outputs
+                }
+        self._snapshot = {}
+        self._dispatched = {}
+        self._deferred = set()
+
+    def _workdir_path(self, value) -> Optional[Path]:
+        """Path inside workdir referenced by argument value if any"""
+        if not isinstance(value, str) or not value:
+            return None
+        path = (self._workdir / value).resolve()
+        if path == self._workdir or self._workdir not in path.parents:
+            return None
+        return path
+
+    @staticmethod
+    def _take_snapshot(paths) -> Dict[Path, Signature]:
+        return {path: path_signature(path) for path in paths}
+
+    async def snapshot(self):
+        """Record current state of watched paths"""
+        loop = get_running_loop()
+        self._snapshot = await loop.run_in_executor(
+            None, self._take_snapshot, list(self._path_tasks)
+        )
+
+    async def _task_snapshot(self, name: str) -> Dict[Path, Signature]:
+        loop = get_running_loop()
+        return await loop.run_in_executor(
+            None, self._take_snapshot, list(self._task_paths[name])
+        )
+
+    async def dispatch(self, name: str):
+        """Record state of paths referenced by a task about to be processed"""
+        self._dispatched[name] = await self._task_snapshot(name)
+
+    async def refresh(self, name: str, after: Optional[Future] = None):
+        """Accept state of paths written by a processed task, once after task
+        completed if given
+        """
+        if after is not None and not after.done():
+            deferred = create_task(self._refresh_after(name, after))
+            self._deferred.add(deferred)
+            deferred.add_done_callback(self._deferred.discard)
+            return
+        await self._refresh(name)
+
+    async def _refresh_after(self, name: str, after: Future):
+        await wait({after})
+        await self._refresh(name)
+
+    async def _refresh(self, name: str):
+        """Accept state of paths written by a processed task
+
+        Output paths, given by task 'outputs' key, take their current state so
+        that the task own writes are not seen as changes. Other paths take
+        the state they had when the task was dispatched, any change made
+        while the task was running is detected by next poll. When a task does
+        not declare its outputs, all its paths take their current state and
+        changes made to its inputs while it was running are missed.
+        """
+        current = await self._task_snapshot(name)
+        dispatched = self._dispatched.pop(name, current)
+        outputs = self._task_outputs.get(name)
+        for path, signature in current.items():
+            if outputs is None or path in outputs:
+                self._snapshot[path] = signature
+            else:
+                self._snapshot[path] = dispatched[path]
+
+    async def poll(self) -> Set[Path]:
+        """Paths which changed since last snapshot, snapshot is updated"""
+        # wait for deferred refreshes, tasks outputs are not settled yet
+        if self._deferred:
+            await wait(set(self._deferred))
+        previous = self._snapshot
+        await self.snapshot()
+        return {
+            path
+            for path, signature in self._snapshot.items()
+            if previous.get(path) != signature
+        }
+
+    async def wait_for_changes(
+        self, interval: float, debounce: float, changed: Set[Path] = None
+    ) -> Set[Path]:
+        """Wait until watched paths change and remain stable for debounce
+        seconds, return all changed paths including already changed ones
+        """
+        changed = set(changed or ())
+        while not changed:
+            await sleep(interval)
+            changed = await self.poll()
+        LOGGER.debug("change detected, debouncing: %s", changed)
+        while True:
+            await sleep(debounce)
+            burst = await self.poll()
+            if not burst:
+                return changed
+            changed.update(burst)
+
+    def affected(self, changed: Set[Path]) -> Set[str]:
+        """Names of tasks referencing changed paths"""
+        names = set()
+        for path in changed:
+            names.update(self._path_tasks.get(path, set()))
+        return names